@@ -0,0 +1,185 @@
+"""
+.. bars.py
+
+Aggregation of ticks into bars.
+"""
+
+## Inheritance
+import base
+
+## Extrema
+import pushqueue as pq
+
+## Data types
+import collections as col
+import numpy as np
+
+nan = float('nan')
+
+
+Bar = col.namedtuple(
+    'Bar', 'open high low close volume vwap count start end')
+
+
+class BarMaker(base.Mover):
+    """ Aggregates ticks into bars, and returns each bar (a :class:`Bar`) as
+    soon as it is completed, and :data:`base.PENDING` otherwise; put in front
+    of other movers in a :class:`base.CompositeMover`, only completed bars
+    are passed on to them. If *field* is given, only that field of the bar
+    (e.g. ``'close'``) is returned.
+
+    A tick is either a price, or a ``(time, price, volume)`` tuple. Exactly
+    one of the following thresholds must be given:
+
+    * *count*: a bar is completed by its *count*-th tick.
+    * *volume*: a bar is completed by the tick bringing its volume to at
+      least *volume*.
+    * *interval*: a bar holds the ticks whose times fall within the same
+      *interval*-long period, and is completed by the first tick beyond it.
+
+    Examples:
+
+    >>> bars = BarMaker(count=2)
+    >>> [bars(price) for price in [1, 3, 2, 5]][-1]
+    Bar(open=2, high=5, low=2, close=5, volume=2, vwap=3.5, count=2, \
+start=None, end=None)
+    >>> ticks = [(0, 1, 10), (1, 3, 30), (2, 2, 10), (3, 5, 10)]
+    >>> bars = BarMaker(interval=2, field='vwap')
+    >>> [bars(tick) for tick in ticks]
+    [PENDING, PENDING, 2.5, PENDING]
+
+    Chained with other movers:
+
+    >>> import ma
+    >>> closes = base.CompositeMover(BarMaker(count=2, field='close'), ma.MA(2))
+    >>> [closes(price) for price in [1, 3, 2, 5, 4, 4]]
+    [PENDING, 3.0, PENDING, 4.0, PENDING, 4.5]
+    """
+    def __init__(self, count=None, interval=None, volume=None, field=None,
+                 **kwargs):
+        if [count, interval, volume].count(None) != 2:
+            raise ValueError(
+                "Exactly one of count, interval or volume must be given.")
+        self.count = count
+        self.interval = interval
+        self.volume = volume
+        self.field = field
+        super(BarMaker, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        try:
+            time, price, volume = value
+        except TypeError:
+            time, price, volume = None, value, 1
+
+        bar = base.PENDING
+
+        ## A tick beyond the current period completes the current bar
+        if self.interval is not None:
+            period = time // self.interval
+            if self._count and period != self._period:
+                bar = self._complete()
+            self._period = period
+
+        ## Add the tick to the current bar
+        if not self._count:
+            self._open = price
+            self._start = time
+        self._high.push(price)
+        self._low.push(price)
+        self._close = price
+        self._end = time
+        self._volume += volume
+        self._pv += price * volume
+        self._count += 1
+
+        ## The tick completes the current bar
+        if (self.count is not None and self._count >= self.count) or \
+                (self.volume is not None and self._volume >= self.volume):
+            bar = self._complete()
+
+        if self.field is None or bar is base.PENDING:
+            return bar
+        return getattr(bar, self.field)
+
+    def _complete(self):
+        """ Return the current bar, and start a new one. """
+        try:
+            vwap = self._pv / self._volume
+        except ZeroDivisionError:
+            vwap = nan
+        bar = Bar(self._open, self._high.max, self._low.min, self._close,
+                  self._volume, vwap, self._count, self._start, self._end)
+        self._clear()
+        return bar
+
+    def _clear(self):
+        self._high.clear()
+        self._low.clear()
+        self._count = 0
+        self._volume = 0
+        self._pv = 0.0
+
+    def _zero(self):
+        ## A count bar holds at most *count* ticks
+        self._high = pq.MaxQueue(maxlen=self.count)
+        self._low = pq.MinQueue(maxlen=self.count)
+        self._period = None
+        self._clear()
+
+    def batch(self, prices, volumes=None, times=None):
+        """ Return the bars which would have been completed by the ticks
+        given by *prices*, *volumes* (1 each by default) and *times*, as a
+        :class:`Bar` of arrays (or just the array of *field*, if given). """
+        prices = np.asarray(prices)
+        size = len(prices)
+        if volumes is None:
+            volumes = np.ones(size, dtype=int)
+        volumes = np.asarray(volumes)
+
+        ## Find where bars start, and how many of them are completed
+        if self.count is not None:
+            starts = np.arange(0, size, self.count)
+            completed = size // self.count
+        elif self.interval is not None:
+            periods = np.asarray(times) // self.interval
+            starts = np.flatnonzero(np.diff(periods)) + 1
+            starts = np.concatenate(([0], starts)) if size else starts
+            completed = max(len(starts) - 1, 0)
+        else:
+            starts, completed = self._volume_starts(np.cumsum(volumes))
+        ends = np.append(starts[1:], size)
+
+        ## Aggregate all bars, and keep the completed ones
+        if size:
+            bars = Bar(
+                prices[starts], np.maximum.reduceat(prices, starts),
+                np.minimum.reduceat(prices, starts), prices[ends - 1],
+                np.add.reduceat(volumes, starts),
+                np.add.reduceat(prices * volumes, starts, dtype=float),
+                ends - starts,
+                None if times is None else np.asarray(times)[starts],
+                None if times is None else np.asarray(times)[ends - 1])
+        else:
+            bars = Bar(*[prices[:0]] * 7 + [
+                None if times is None else np.asarray(times)[:0]] * 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bars = bars._replace(vwap=bars.vwap / bars.volume)
+        bars = Bar(*[x if x is None else x[:completed] for x in bars])
+
+        if self.field is None:
+            return bars
+        return getattr(bars, self.field)
+
+    def _volume_starts(self, cumvolume):
+        """ Return the starts of volume bars, given the cumulative volume
+        of the ticks, and the number of completed bars. """
+        size = len(cumvolume)
+        starts = []
+        start, reached = 0, 0
+        while start < size:
+            starts.append(start)
+            start = np.searchsorted(cumvolume, reached + self.volume) + 1
+            reached = cumvolume[min(start, size) - 1]
+        completed = len(starts) - int(start > size)
+        return np.array(starts, dtype=int), completed
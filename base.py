@@ -12,6 +12,15 @@ import operator as op
 
 ## Basic data types
 import collections as col
+import numpy as np
+
+## Memory accounting
+import sys
+import types
+
+## Parents of compound movers
+import weakref
+inf = float('inf')
 
 
 #######################
@@ -20,6 +29,9 @@ import collections as col
 
 class Deque(col.deque):
     def __init__(self, iterable=(), maxlen=None):
+        ## An infinite length (a float, which Python 3 rejects) is no limit
+        if maxlen == inf:
+            maxlen = None
         try:
             super(Deque, self).__init__(iterable, maxlen=maxlen)
         except OverflowError:
@@ -54,31 +66,26 @@ class Deque(col.deque):
 ######################################
 import abc
 
+## Marks a mover which has no output to compare with
+_UNSET = object()
+
 
 class Mover(object):
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, none=None, patient=False):
+    def __init__(self, none=None, patient=False, gate=None):
         ## Updating general attributes
         self.none = none
         self.patient = patient
         self.triggered = False
 
-        ## Defining mathematical (unary) methods
-        for method_name in ("__neg__", "__pos__", "__abs__", "__float__"):
-            def function(self, __name=method_name):
-                return CompoundMover(getattr(op, __name), self)
-            setattr(self.__class__, method_name, function)
-
-        ## Defining comparison and mathematical (binary) methods
-        for method_name in (
-                "__lt__", "__le__", "__eq__", "__ne__", "__gt__", "__ge__",
-                "__add__", "__sub__", "__mul__", "__floordiv__", "__mod__",
-                "__divmod__", "__pow__", "__radd__", "__rsub__", "__rmul__",
-                "__rdiv__", "__rmod__", "__rpow__"):
-            def function(self, other, __name=method_name):
-                return CompoundMover(getattr(op, __name), self, other)
-            setattr(self.__class__, method_name, function)
+        ## Change gating: if *gate* is not None, an output which does not
+        ## differ from the last one (see :meth:`_differs`) is not passed on
+        self._parents = []
+        self._listeners = []
+        self.gate = gate
+        self.changed = True
+        self._output = _UNSET
 
         ## Initialize
         self._zero()
@@ -92,13 +99,84 @@ class Mover(object):
     def __call__(self, value):
         if value is self.none:
             self.triggered = False
-            return self._zero()
+            self.changed = True
+            self._output = _UNSET
+            zero = self._zero()
+            self._notify(None)
+            return zero
 
         ## Eat
         eaten = self._eat(value)
-        if (not self.patient) or self.triggered:
+        if self.patient and not self.triggered:
+            eaten = None
+
+        ## Ungated and unobserved: nothing to compare, and no one to notify
+        if self._plain:
+            self.changed = eaten is not PENDING
+            return eaten
+
+        ## Nothing to pass on (yet), so nothing has changed
+        if eaten is PENDING:
+            self.changed = False
             return eaten
 
+        ## Unchanged output: return the last one, and notify no one
+        if self._gate is not None:
+            if self._output is not _UNSET and \
+                    not self._differs(self._output, eaten):
+                self.changed = False
+                return self._output
+            self._output = eaten
+
+        self.changed = True
+        self._notify(eaten)
+        return eaten
+
+    def _notify(self, output):
+        """ Call the listeners of the mover with *output*. """
+        for listener in self._listeners:
+            listener(output)
+
+    @property
+    def gate(self):
+        """ The change gate of the mover (see :meth:`_differs`), or ``None``
+        if it is not gated. """
+        return self._gate
+
+    @gate.setter
+    def gate(self, value):
+        self._gate = value
+        self._plain = value is None and not self._listeners
+
+        ## Compound movers of this one may now have to track its changes
+        for parent in self._parents:
+            parent = parent()
+            if parent is not None:
+                parent._track()
+
+    def _differs(self, old, new):
+        """ Return whether the output *new* differs from the last output
+        *old*, according to the mover's gate: a function of *old* and *new*,
+        or a tolerance (0 for exact comparison) of numbers, arrays, and
+        tuples or lists of them. """
+        if callable(self._gate):
+            return self._gate(old, new)
+        if isinstance(new, (tuple, list)) and isinstance(old, (tuple, list)):
+            return len(new) != len(old) or \
+                any(self._differs(o, n) for o, n in zip(old, new))
+        try:
+            return not np.all(abs(new - old) <= self._gate)
+        except (TypeError, ValueError):
+            return new != old
+
+    def subscribe(self, listener):
+        """ Call *listener* with every new output of the mover (but not with
+        :data:`PENDING`), and with ``None`` whenever the mover is reset; if
+        the mover is gated, only with outputs which differ from the last
+        one. """
+        self._listeners.append(listener)
+        self._plain = False
+
     def _compose(self, other):
         raise NotImplementedError
 
@@ -120,13 +198,231 @@ class Mover(object):
             err_msg = "'{_cls}' object has no attribute 'copy'"
             raise AttributeError(err_msg.format(_cls=self.__class__.__name__))
 
+    @property
+    def nbytes(self):
+        """ The memory (in bytes) currently used by the mover, including its
+        windows, queues and inner movers. """
+        return sizeof(self)
+
+    @property
+    def max_nbytes(self):
+        """ The most memory (in bytes) the mover may use, once its windows
+        are full; ``inf`` if any of them is unbounded. """
+        return sizeof(self, worst=True)
+
+
+## Defining mathematical (unary) methods, once, rather than on every
+## initialization (which would race with movers made in other threads)
+for method_name in ("__neg__", "__pos__", "__abs__", "__float__"):
+    def function(self, __name=method_name):
+        return CompoundMover(getattr(op, __name), self)
+    setattr(Mover, method_name, function)
+
+## Defining comparison and mathematical (binary) methods
+for method_name in (
+        "__lt__", "__le__", "__eq__", "__ne__", "__gt__", "__ge__",
+        "__add__", "__sub__", "__mul__", "__floordiv__", "__mod__",
+        "__divmod__", "__pow__", "__radd__", "__rsub__", "__rmul__",
+        "__rdiv__", "__rmod__", "__rpow__"):
+    def function(self, other, __name=method_name):
+        return CompoundMover(getattr(op, __name), self, other)
+    setattr(Mover, method_name, function)
+del method_name, function
+
+
+def _patient(mover, out, waiting):
+    """ Return the batch output *out* of *mover*, where if it is patient, its
+    first *waiting* outputs are suppressed (set to NaN). """
+    if mover.patient:
+        out = np.array(out, dtype=float)
+        out[:int(min(waiting, len(out)))] = np.nan
+    return out
+
+
+def _split_resets(data):
+    """ Return *data* as an array in which ``None`` values are replaced by 0
+    (or by rows of 0), and a boolean array marking where they were. """
+    try:
+        array = np.asarray(data)
+        if array.dtype != object:
+            return array, np.zeros(len(array), dtype=bool)
+    except ValueError:
+        pass
+    resets = np.array([value is None for value in data], dtype=bool)
+    first = next((value for value in data if value is not None), 0)
+    zero = np.zeros_like(first).tolist() if np.ndim(first) else 0
+    return np.array([zero if reset else value
+                     for value, reset in zip(data, resets)]), resets
+
+
+def _by_segments(batch, resets, *arrays):
+    """ Return the batch output of *batch*, a function of *arrays*, applied
+    to each segment of them between resets, as if by a mover reset by
+    ``None``: an output is NaN (or a row of NaNs) wherever there was a
+    reset. """
+    bounds = np.flatnonzero(resets)
+    outs = [batch(*[array[start:stop] for array in arrays])
+            for start, stop in zip(np.append(0, bounds + 1),
+                                   np.append(bounds, len(resets)))]
+    out = np.full((len(resets),) + np.shape(outs[0])[1:], np.nan)
+    out[~resets] = np.concatenate(outs)
+    return out
+
+
+def _block(n, size):
+    """ Return the length of the blocks in which moving windows of length *n*
+    over *size* values are summed (see :func:`_blocks`): the least power of
+    two no shorter than *n*, but no longer than all values. """
+    if n >= size:
+        return max(size, 1)
+    return int(2 ** np.ceil(np.log2(max(n, 1))))
+
+
+def _blocks(block, *arrays):
+    """ Return *arrays* laid out in rows of two blocks of length *block*:
+    each block after the one before it (zeros, for the first block), so that
+    any moving window no longer than *block* lies within the row of the
+    block it ends in. Window sums may then be taken from cumulative sums of
+    each row, anchored near the window (e.g. by shifting the values of a row
+    by the first value of its second block), which keeps them precise however
+    far the values drift. """
+    count = -(-len(arrays[0]) // block)
+    rows = []
+    for array in arrays:
+        padded = np.zeros((count + 2) * block, dtype=array.dtype)
+        padded[block:block + len(array)] = array
+        rows.append(np.lib.stride_tricks.sliding_window_view(
+            padded, 2 * block)[::block][:count])
+    return rows
+
+
+def _block_windows(block, n, size):
+    """ Return where each of the moving windows of length *n* over *size*
+    values lies in the rows of :func:`_blocks`: the arrays of their rows,
+    and of their starts and ends in the row cumulative sums (with a leading
+    zero), so that a window sum is ``cumulative[row, end] -
+    cumulative[row, start]``. """
+    index = np.arange(size)
+    rows = index // block
+    ends = block + index % block + 1
+    starts = (ends - np.minimum(index + 1, n)).astype(int)
+    return rows, starts, ends
+
+
+def _cumulative(rows):
+    """ Return the cumulative sums of *rows*, each with a leading zero. """
+    out = np.zeros((len(rows), rows.shape[1] + 1))
+    np.cumsum(rows, axis=1, out=out[:, 1:])
+    return out
+
+
+def _unrecovered(values, *outs):
+    """ Set the finite items of the arrays *outs* after the first value of
+    *values* which is not finite to NaN, in place, as the running sums of a
+    mover never recover from it (while block sums do, see :func:`_blocks`).
+    """
+    bad = ~np.isfinite(values)
+    if bad.any():
+        after = np.arange(len(values)) > np.argmax(bad)
+        for out in outs:
+            out[after & np.isfinite(out)] = np.nan
+
+
+###################################
+## ----- Memory accounting ----- ##
+###################################
+
+## Shared code and types, which are not counted
+_UNSIZED = (type, types.ModuleType, types.FunctionType, types.MethodType,
+            types.BuiltinFunctionType)
+
+Footprint = col.namedtuple('Footprint', 'nbytes max_nbytes unbounded')
+
+
+def sizeof(obj, worst=False, seen=None):
+    """ Return the memory (in bytes) used by *obj* and everything it holds,
+    where every object is counted once (objects already in the *seen* set of
+    ids are not counted). If *worst*, return the most memory *obj* may use,
+    assuming each deque it holds is filled up to its maximal length, with
+    elements the size of its current ones (or of a float, while empty);
+    objects which keep their elements otherwise may tell how much memory
+    they hold at most by a ``_worst_nbytes(seen)`` method. """
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, _UNSIZED):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    ## Deques
+    if isinstance(obj, col.deque):
+        items = sum(sizeof(item, worst, seen) for item in obj)
+        if worst and obj.maxlen is None:
+            return inf
+        if worst and obj.maxlen > len(obj):
+            slot = sys.getsizeof(col.deque(range(64))) / 64.0
+            item = items / float(len(obj)) if len(obj) else \
+                sys.getsizeof(0.0)
+            size += (obj.maxlen - len(obj)) * (slot + item)
+        return size + items
+
+    ## Containers
+    if isinstance(obj, dict):
+        return size + sum(sizeof(key, worst, seen) + sizeof(value, worst, seen)
+                          for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(sizeof(item, worst, seen) for item in obj)
+
+    ## Objects (movers, queues, etc.)
+    if worst and hasattr(obj, '_worst_nbytes'):
+        return size + obj._worst_nbytes(seen)
+    try:
+        return size + sizeof(vars(obj), worst, seen)
+    except TypeError:
+        return size
+
+
+def footprint(movers):
+    """ Return the :class:`Footprint` of *movers*, a collection (or a dict)
+    of movers: the memory they currently use, the most memory they may use,
+    and the movers (or their keys) whose memory use is unbounded. Objects
+    shared by several movers are counted once.
+
+    Example:
+
+    >>> import ma
+    >>> movers = {'ma': ma.MA(10), 'ema': ma.EMA(10), 'all': ma.MA()}
+    >>> sorted(footprint(movers).unbounded)
+    ['all']
+    """
+    if not isinstance(movers, dict):
+        movers = dict(enumerate(movers))
+    seen, worst_seen = set(), set()
+    nbytes = max_nbytes = 0
+    unbounded = []
+    for key, mover in movers.items():
+        nbytes += sizeof(mover, seen=seen)
+        worst = sizeof(mover, worst=True, seen=worst_seen)
+        if worst == inf:
+            unbounded.append(key)
+        max_nbytes += worst
+    return Footprint(nbytes, max_nbytes, unbounded)
+
 
 ################################
 ## ----- Special Movers ----- ##
 ################################
 
+class _Pending(object):
+    def __repr__(self):
+        return "PENDING"
+
+## Returned by movers which have nothing to pass on (yet); a composition
+## stops as soon as one of its movers returns it
+PENDING = _Pending()
+
+
 def movify(x):
-    if not isinstance(x, col.Callable):
+    if not callable(x):
         return ConstantMover(x)
     return x
 
@@ -139,6 +435,8 @@ class CompositeMover(Mover):
     def _eat(self, value):
         for mover in self.movers:
             value = mover(value)
+            if value is PENDING:
+                break
         return value
 
     @property
@@ -155,28 +453,168 @@ class CompositeMover(Mover):
 
 
 class CompoundMover(Mover):
+    """ Applies *function* to the outputs of *movers*. A lazy compound mover
+    (see :func:`set_lazy`) feeds its movers eagerly, but returns itself, and
+    applies *function* only when its :attr:`value` is read, once per change
+    of its movers. A gate on a lazy compound mover compares no values: its
+    output counts as changed whenever any of its movers' has; and its
+    listeners get its value (which is then computed), not itself.
+
+    Unless a compound mover is lazy, or has movers which may not change
+    (gated ones, or compound movers which track changes themselves) or are
+    lazy, it keeps no track of changes, and just applies *function* to the
+    outputs of its movers. """
+    _lazy = False
+    _tracking = False
+
     def __init__(self, function, *movers):
         self.function = function
         self.movers = [movify(mover) for mover in movers]
         super(CompoundMover, self).__init__()
+        for mover in self.movers:
+            parents = getattr(mover, '_parents', None)
+            if parents is not None:
+                parents.append(weakref.ref(self))
+        self._track()
+
+    @property
+    def lazy(self):
+        """ Whether the mover is lazy (see :func:`set_lazy`). """
+        return self._lazy
+
+    @lazy.setter
+    def lazy(self, value):
+        self._lazy = value
+        self._track()
+
+    def _track(self):
+        """ Decide whether the mover has to track the changes of its movers
+        (see :class:`CompoundMover`), and if that has changed, start afresh,
+        and let the compound movers of this one decide too. """
+        tracking = self._lazy or any(
+            getattr(m, '_gate', None) is not None or
+            getattr(m, '_tracking', False) for m in self.movers)
+        if tracking == self._tracking:
+            return
+        self._tracking = tracking
+        self._values = None
+        self._result = _UNSET
+        for parent in self._parents:
+            parent = parent()
+            if parent is not None:
+                parent._track()
 
     def _eat(self, value):
-        return self.function(*[m(value) for m in self.movers])
+        if not self._tracking:
+            self._result = self.function(*[m(value) for m in self.movers])
+            return self._result
+
+        movers = self.movers
+        values = [m(value) for m in movers]
+
+        ## None of the movers has changed, so neither has the result
+        if self._values is not None:
+            for mover in movers:
+                if getattr(mover, 'changed', True):
+                    break
+            else:
+                self._dirty = False
+                return self if self._lazy else self._result
+
+        self._values = values
+        self._dirty = True
+        if self._lazy:
+            self._result = _UNSET
+            return self
+        return self._apply()
+
+    def _apply(self):
+        """ Apply the function to the last outputs of the movers, and return
+        (and keep) the result. """
+        ## Lazy movers return themselves, so their values have to be read
+        self._result = self.function(*[
+            value.value if value is mover else value
+            for value, mover in zip(self._values, self.movers)])
+        return self._result
+
+    def _differs(self, old, new):
+        ## A lazy mover returns itself, which only its movers may change
+        if new is self or old is self:
+            return self._dirty
+        return super(CompoundMover, self)._differs(old, new)
+
+    def _notify(self, output):
+        super(CompoundMover, self)._notify(
+            self.value if output is self else output)
+
+    @property
+    def value(self):
+        """ The current output of the mover (``None`` before any). """
+        if self._result is _UNSET:
+            if self._values is None:
+                return None
+            return self._apply()
+        return self._result
 
     def _zero(self):
+        self._values = None
+        self._result = _UNSET
+        self._dirty = True
         super(CompoundMover, self)._zero()
 
 
+def set_lazy(mover, lazy=True):
+    """ Make the compound movers in the tree of *mover* lazy (or eager, if not
+    *lazy*), and return *mover*. Stateful movers still eat every value, but
+    lazy compound movers only compute their values when read (see
+    :class:`CompoundMover`). Compound movers whose output is fed to the next
+    mover of a :class:`CompositeMover` stay eager.
+
+    Example:
+
+    >>> import ma
+    >>> spread = set_lazy(ma.EMA(1) - ma.EMA(3))
+    >>> [spread(value) is spread for value in [1, 2, 3]]
+    [True, True, True]
+    >>> spread.value
+    0.75
+    """
+    if isinstance(mover, CompoundMover):
+        mover.lazy = lazy
+    for child in getattr(mover, 'movers', ()):
+        set_lazy(child, lazy)
+
+    ## Each mover of a composition but the last feeds the next one
+    if isinstance(mover, CompositeMover):
+        for child in mover.movers[:-1]:
+            if isinstance(child, CompoundMover):
+                child.lazy = False
+    return mover
+
+
 class ConstantMover(Mover):
+    """ Returns *value*, whatever it eats; only its first output (since it
+    was reset) counts as changed. """
     def __init__(self, value, **kwargs):
         self.value = value
         super(ConstantMover, self).__init__(**kwargs)
 
+    def __call__(self, value):
+        if value is self.none or self._fresh:
+            self._fresh = False
+            self._out = super(ConstantMover, self).__call__(value)
+            return self._out
+
+        ## The same output again: there is nothing to compare
+        self.changed = False
+        return self._out
+
     def _eat(self, value):
         return self.value
 
     def _zero(self):
-        super(ConstantMover, self)._zero()
+        self._fresh = True
+        self._out = None
 
 
 class Delayer(Mover):
@@ -195,3 +633,76 @@ class Delayer(Mover):
 
     def _zero(self):
         self._deque = Deque((), maxlen=self.n)
+
+
+class LagMatrix(Mover):
+    """ Returns, at once, the values that were entered each of *lags* steps
+    earlier (0 being the current value), as an array ordered like *lags*.
+    This replaces a stack of :class:`Delayer` movers (or ``<<``
+    compositions) with a single buffer. Like a :class:`Delayer`, a lag for
+    which there is not yet enough data gets the oldest value entered, and the
+    mover is triggered once the largest lag is available.
+
+    Example:
+
+    >>> lm = LagMatrix([0, 2])
+    >>> [lm(value).tolist() for value in [1, 2, 3, 4]]
+    [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [4.0, 2.0]]
+    >>> lm.window
+    array([2., 3., 4.])
+    >>> LagMatrix([0, 1, 2]).batch([1, 2, 3, 4])
+    array([[3., 2., 1.],
+           [4., 3., 2.]])
+    """
+    def __init__(self, lags, dtype=float, **kwargs):
+        self.lags = np.asarray(lags, dtype=int)
+        self.dtype = dtype
+        self._size = int(self.lags.max()) + 1
+        super(LagMatrix, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        ## Every value is written twice, so the window is always contiguous
+        size = self._size
+        index = self._index
+        self._buffer[index] = self._buffer[index + size] = value
+        self._index = (index + 1) % size
+        self._count += 1
+
+        ## Not enough data for the largest lag
+        if self._count < size:
+            lags = np.minimum(self.lags, self._count - 1)
+            return self.window[-1 - lags]
+
+        self.triggered = True
+        return self.window[self._columns]
+
+    def _zero(self):
+        self._buffer = np.zeros(2 * self._size, dtype=self.dtype)
+        self._columns = self._size - 1 - self.lags
+        self._index = 0
+        self._count = 0
+
+    @property
+    def window(self):
+        """ A view of the buffered values, oldest first. """
+        start = self._index + self._size - min(self._count, self._size)
+        return self._buffer[start:self._index + self._size]
+
+    def batch(self, data):
+        """ Return the lag matrix of *data*: a row for each step in which the
+        mover would have been triggered, and a column for each of the lags.
+        When the lags are evenly spaced (or there is just one) the matrix is
+        a strided view of *data*, and nothing is copied. """
+        data = np.asarray(data, dtype=self.dtype)
+        windows = np.lib.stride_tricks.as_strided(
+            data, shape=(max(len(data) - self._size + 1, 0), self._size),
+            strides=(data.strides[0], data.strides[0]), writeable=False)
+
+        ## Evenly spaced lags may be sliced, anything else has to be copied
+        columns = self._columns
+        steps = np.diff(columns)
+        step = steps[0] if len(steps) else 1
+        if step and (steps == step).all():
+            stop = columns[-1] + step
+            return windows[:, columns[0]:stop if stop >= 0 else None:step]
+        return windows[:, columns]
@@ -0,0 +1,205 @@
+"""
+.. harness.py
+
+Differential testing of fast paths (batch methods and the like) against the
+movers themselves, which eat one value at a time.
+"""
+
+## Data
+import collections as col
+import random
+import numpy as np
+
+## Timing
+import timeit
+
+nan = float('nan')
+inf = float('inf')
+
+
+#########################
+## ----- Streams ----- ##
+#########################
+
+def streams(size=1000, seed=0, kinds=None):
+    """ Return a dict of random and adversarial data streams of length
+    *size*, by their kinds (all but ``'weighted'``, by default):
+
+    * ``'random'``: normally distributed values.
+    * ``'ties'``: a few small integers, so there are many equal values.
+    * ``'steps'``: runs of constant values.
+    * ``'huge'``: huge values with small differences.
+    * ``'nans'``: normally distributed values, some of which are NaN.
+    * ``'resets'``: normally distributed values, some of which are ``None``.
+    * ``'weighted'``: ``(value, weight)`` pairs, with positive weights.
+    """
+    rng = random.Random(seed)
+    gauss = [rng.gauss(0, 1) for _ in range(size)]
+
+    def sprinkle(values, special):
+        return [special if rng.random() < 0.02 else v for v in values]
+
+    def steps():
+        values = []
+        while len(values) < size:
+            values += [float(rng.randint(-5, 5))] * rng.randint(1, 20)
+        return values[:size]
+
+    makers = {
+        'random': lambda: gauss,
+        'ties': lambda: [rng.randint(-2, 2) for _ in range(size)],
+        'steps': steps,
+        'huge': lambda: [1e12 + v for v in gauss],
+        'nans': lambda: sprinkle(gauss, nan),
+        'resets': lambda: sprinkle(gauss, None),
+        'weighted': lambda: [(v, rng.randint(1, 3)) for v in gauss],
+    }
+    if kinds is None:
+        kinds = sorted(kind for kind in makers if kind != 'weighted')
+    return dict((kind, makers[kind]()) for kind in kinds)
+
+
+#############################
+## ----- Comparisons ----- ##
+#############################
+
+def same(expected, got, rtol=0, atol=0):
+    """ Return whether the output *got* matches the output *expected*, up to
+    the relative and absolute tolerances *rtol* and *atol* (exactly, by
+    default). NaN matches NaN, and ``None`` (an output suppressed by a
+    patient mover) matches both ``None`` and NaN (or a row of NaNs);
+    sequences match if all of their items do. """
+    if expected is None:
+        return got is None or _isnan(got)
+    if isinstance(expected, (tuple, list, np.ndarray)):
+        try:
+            return len(expected) == len(got) and all(
+                same(e, g, rtol, atol) for e, g in zip(expected, got))
+        except TypeError:
+            return False
+
+    ## A single value matches no sequence (not even of NaNs)
+    if isinstance(got, (tuple, list)) or getattr(got, 'ndim', 0):
+        return False
+    if _isnan(expected):
+        return _isnan(got)
+    try:
+        return expected == got or \
+            abs(expected - got) <= atol + rtol * abs(expected)
+    except TypeError:
+        return False
+
+
+def _isnan(x):
+    """ Return whether *x* is NaN (or a non-empty array of NaNs). """
+    try:
+        return bool(np.size(x)) and bool(np.isnan(x).all())
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+class Report(col.namedtuple(
+        'Report', 'stream size mismatches reference_time fast_time')):
+    """ The result of comparing a fast path with the reference one on a
+    stream: the mismatches are ``(index, expected, got)`` tuples, and
+    ``(None, expected length, got length)`` if the lengths differ. """
+    @property
+    def speedup(self):
+        """ How many times faster the fast path was. """
+        try:
+            return self.reference_time / self.fast_time
+        except ZeroDivisionError:
+            return inf
+
+
+def reference(factory, data):
+    """ Return the outputs of a fresh mover made by *factory*, eating *data*
+    one value at a time. """
+    mover = factory()
+    return [mover(value) for value in data]
+
+
+def batch(factory, data):
+    """ Return the outputs of the batch method of a fresh mover made by
+    *factory*, for *data*. """
+    return factory().batch(data)
+
+
+def compare(factory, data, fast=batch, rtol=0, atol=0, stream=None):
+    """ Run the reference path and the *fast* path (a function of *factory*
+    and *data*, see :func:`batch`) on *data*, and return their
+    :class:`Report`. """
+    start = timeit.default_timer()
+    expected = reference(factory, data)
+    reference_time = timeit.default_timer() - start
+
+    start = timeit.default_timer()
+    got = fast(factory, data)
+    fast_time = timeit.default_timer() - start
+
+    mismatches = [(i, e, g) for i, (e, g) in enumerate(zip(expected, got))
+                  if not same(e, g, rtol, atol)]
+    if len(got) != len(expected):
+        mismatches.append((None, len(expected), len(got)))
+    return Report(stream, len(data), mismatches, reference_time, fast_time)
+
+
+def check(factory, fast=batch, size=1000, seed=0, kinds=None, rtol=0,
+          atol=0):
+    """ Compare the reference path and the *fast* path of movers made by
+    *factory* on each of the :func:`streams` of the given *kinds*, and return
+    their :class:`Report` list.
+
+    Example:
+
+    >>> import ma
+    >>> reports = check(lambda: ma.EMA(3), kinds=['ties', 'steps'], rtol=1e-9)
+    >>> [(report.stream, report.mismatches) for report in reports]
+    [('steps', []), ('ties', [])]
+    """
+    data = streams(size, seed, kinds)
+    return [compare(factory, data[kind], fast, rtol, atol, stream=kind)
+            for kind in sorted(data)]
+
+
+## Window lengths, from the shortest ones to ones longer than the streams
+## (which never fill up)
+WINDOWS = (1, 2, 10, 1000, 10000, inf)
+
+
+def check_windows(factory, fast=batch, windows=WINDOWS, size=2000, seed=0,
+                  kinds=None, rtol=0, atol=0):
+    """ :func:`check` movers made by *factory*, a function of a window
+    length, for each of *windows*, and return a dict of their
+    :class:`Report` lists, by windows.
+
+    Example:
+
+    >>> import ma
+    >>> reports = check_windows(ma.MA, windows=[1, inf], kinds=['ties'],
+    ...                         rtol=1e-9)
+    >>> [[report.mismatches for report in reports[n]] for n in [1, inf]]
+    [[[]], [[]]]
+    """
+    return dict((n, check(lambda: factory(n), fast, size, seed, kinds, rtol,
+                          atol))
+                for n in windows)
+
+
+############################
+## ----- Benchmarks ----- ##
+############################
+
+Benchmark = col.namedtuple('Benchmark', 'report exact_nbytes approx_nbytes')
+
+
+def benchmark(exact, approx, data, rtol=0.05):
+    """ Run a fresh exact mover and a fresh approximating one (e.g. a sketch
+    of :mod:`sketch`), made by the factories *exact* and *approx*, on *data*,
+    and return their :class:`Benchmark`: the :class:`Report` of the
+    approximating mover (where mismatches are outputs off by more than
+    *rtol*), and the memory each mover ended up using. """
+    movers = exact(), approx()
+    report = compare(lambda: movers[0], data, rtol=rtol,
+                     fast=lambda _, data: [movers[1](value) for value in data])
+    return Benchmark(report, movers[0].nbytes, movers[1].nbytes)
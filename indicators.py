@@ -0,0 +1,241 @@
+"""
+.. indicators.py
+
+Fused technical indicators: each keeps all the moving averages it needs, and
+computes all of its outputs, in a single step.
+"""
+
+## Inheritance
+import base
+
+## Moving averages
+import ma
+
+## Math
+import numpy as np
+inf = float('inf')
+
+
+def _ema_step(mean, value, alpha):
+    """ Return the exponential moving average following *mean* (or starting,
+    if it's ``None``) once *value* is eaten, just like :class:`ma.EMA`. """
+    if mean is None:
+        return value * 1.0
+    return alpha * value + (1 - alpha) * mean
+
+
+class MACD(base.Mover):
+    """ Moving average convergence/divergence: the difference between the
+    *fast* and *slow* exponential moving averages, its *signal* exponential
+    moving average, and the difference between the two (the histogram). This
+    returns what ``(EMA(fast) - EMA(slow))`` followed by ``EMA(signal)``
+    would, along with the histogram, and is triggered with the slow EMA.
+
+    Example:
+
+    >>> macd = MACD(1, 3, 1)
+    >>> [macd(value) for value in [1, 2, 3]]
+    [(0.0, 0.0, 0.0), (0.5, 0.5, 0.0), (0.75, 0.75, 0.0)]
+    """
+    def __init__(self, fast=12, slow=26, signal=9, **mover_kwargs):
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self._alphas = [2.0 / (n + 1.0) for n in (fast, slow, signal)]
+        super(MACD, self).__init__(**mover_kwargs)
+
+    @property
+    def triggered(self):
+        return self.count > self.slow
+
+    @triggered.setter
+    def triggered(self, value):
+        if not value:
+            self.count = 0
+
+    def _eat(self, value):
+        self.count += 1
+        fast_alpha, slow_alpha, signal_alpha = self._alphas
+        self._fast = _ema_step(self._fast, value, fast_alpha)
+        self._slow = _ema_step(self._slow, value, slow_alpha)
+        macd = self._fast - self._slow
+        self._signal = _ema_step(self._signal, macd, signal_alpha)
+        return macd, self._signal, macd - self._signal
+
+    def _zero(self):
+        self._fast = None
+        self._slow = None
+        self._signal = None
+
+    def batch(self, data):
+        """ Return what a fresh mover would return for each number of *data*,
+        as an array of rows, where ``None`` values reset the mover (and NaN
+        stands for their output). """
+        values, resets = base._split_resets(data)
+        if resets.any():
+            return base._by_segments(self.batch, resets, values)
+        values = values.astype(float)
+        fast_alpha, slow_alpha, signal_alpha = self._alphas
+        macd = ma._ema(values, fast_alpha) - ma._ema(values, slow_alpha)
+        signal = ma._ema(macd, signal_alpha)
+        out = np.column_stack((macd, signal, macd - signal))
+        return base._patient(self, out, self.slow)
+
+
+class DEMA(base.Mover):
+    """ Double exponential moving average of typical period *n*: twice the
+    EMA, minus the EMA of the EMA. With *order* 3, this is the triple
+    exponential moving average (TEMA): three times the EMA, minus three times
+    the EMA of the EMA, plus the EMA of that. Triggered with the EMA.
+
+    Example:
+
+    >>> dema = DEMA(3)
+    >>> [dema(value) for value in [1, 2, 3]]
+    [1.0, 1.75, 2.75]
+    """
+    _coefficients = {2: (2, -1), 3: (3, -3, 1)}
+
+    def __init__(self, n, order=2, **mover_kwargs):
+        self.n = n
+        self.order = order
+        self._alpha = 2.0 / (n + 1.0)
+        super(DEMA, self).__init__(**mover_kwargs)
+
+    @property
+    def triggered(self):
+        return self.count > self.n
+
+    @triggered.setter
+    def triggered(self, value):
+        if not value:
+            self.count = 0
+
+    def _eat(self, value):
+        self.count += 1
+        for i, mean in enumerate(self._means):
+            value = self._means[i] = _ema_step(mean, value, self._alpha)
+        return sum(c * mean for c, mean in
+                   zip(self._coefficients[self.order], self._means))
+
+    def _zero(self):
+        self._means = [None] * self.order
+
+    def batch(self, data):
+        """ Return what a fresh mover would return for each number of *data*,
+        as an array, where ``None`` values reset the mover (and NaN stands
+        for their output). """
+        means, resets = base._split_resets(data)
+        if resets.any():
+            return base._by_segments(self.batch, resets, means)
+        means = means.astype(float)
+        out = np.zeros(len(means))
+        for c in self._coefficients[self.order]:
+            means = ma._ema(means, self._alpha)
+            out += c * means
+        return base._patient(self, out, self.n)
+
+
+class TEMA(DEMA):
+    """ Triple exponential moving average of typical period *n* (see
+    :class:`DEMA`). """
+    def __init__(self, n, **mover_kwargs):
+        super(TEMA, self).__init__(n, order=3, **mover_kwargs)
+
+
+class _MovingStats(base.Mover):
+    """ Base class for indicators of the mean and standard deviation of a
+    moving data window of length *n*, which are calculated just like
+    :class:`ma.MA` does; triggered once values fall out of the window. """
+    def __init__(self, n=inf, **mover_kwargs):
+        self.n = n
+        super(_MovingStats, self).__init__(**mover_kwargs)
+
+    def _stats(self, value):
+        """ Eat *value*, and return the current mean and std. """
+        out = self._deque.push(value)
+        try:
+            self._sum += value - out
+            self._ssum += value**2 - out**2
+            self.triggered = True
+        except TypeError:
+            self._sum += value
+            self._ssum += value**2
+            self._len += 1
+        _mean = self._sum / self._len
+        _var = (self._ssum * self._len - self._sum ** 2) / (self._len ** 2)
+        return _mean, max(_var, 0) ** 0.5
+
+    def _zero(self):
+        self._deque = self._get_deque(self.n)
+        self._len = 0
+        self._sum = 0.0
+        self._ssum = 0.0
+
+    def _batch_stats(self, data):
+        """ Return the arrays of means and stds for the numbers of *data*. """
+        values = np.asarray(data, dtype=float)
+        means, variances = ma._moving_stats(values, self.n)
+        return values, means, variances ** 0.5
+
+
+class Bollinger(_MovingStats):
+    """ Bollinger bands: the moving average of a data window of length *n*,
+    and the upper and lower bands, *k* moving standard deviations above and
+    below it.
+
+    Example:
+
+    >>> bands = Bollinger(2, k=1)
+    >>> [bands(value) for value in [1, 3, 3]]
+    [(1.0, 1.0, 1.0), (2.0, 3.0, 1.0), (3.0, 3.0, 3.0)]
+    """
+    def __init__(self, n=20, k=2, **mover_kwargs):
+        self.k = k
+        super(Bollinger, self).__init__(n, **mover_kwargs)
+
+    def _eat(self, value):
+        _mean, _std = self._stats(value)
+        return _mean, _mean + self.k * _std, _mean - self.k * _std
+
+    def batch(self, data):
+        """ Return what a fresh mover would return for each number of *data*,
+        as an array of rows, where ``None`` values reset the mover (and NaN
+        stands for their output). """
+        values, resets = base._split_resets(data)
+        if resets.any():
+            return base._by_segments(self.batch, resets, values)
+        _, means, stds = self._batch_stats(values)
+        out = np.column_stack(
+            (means, means + self.k * stds, means - self.k * stds))
+        return base._patient(self, out, self.n)
+
+
+class ZScore(_MovingStats):
+    """ The distance of each value from the moving average of a data window
+    of length *n* (including the value), in moving standard deviations; 0
+    while the deviation is 0.
+
+    Example:
+
+    >>> zscore = ZScore(2)
+    >>> [zscore(value) for value in [1, 3, 3, 1]]
+    [0.0, 1.0, 0.0, -1.0]
+    """
+    def _eat(self, value):
+        _mean, _std = self._stats(value)
+        if not _std:
+            return 0.0
+        return (value - _mean) / _std
+
+    def batch(self, data):
+        """ Return what a fresh mover would return for each number of *data*,
+        as an array, where ``None`` values reset the mover (and NaN stands
+        for their output). """
+        values, resets = base._split_resets(data)
+        if resets.any():
+            return base._by_segments(self.batch, resets, values)
+        values, means, stds = self._batch_stats(values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = np.where(stds == 0, 0.0, (values - means) / stds)
+        return base._patient(self, out, self.n)
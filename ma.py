@@ -9,8 +9,83 @@ import base
 
 ## Math
 import math
+import numpy as np
 inf = float('inf')
 
+## Caching
+import hashlib
+
+
+###############################
+## ----- Batch helpers ----- ##
+###############################
+
+def _ema(values, alpha, mean=None):
+    """ Return the exponential moving averages of the array *values* with
+    smoothing factor *alpha*, starting from *mean* (or from the first value).
+    The averages are computed in blocks, each as a scaled cumulative sum,
+    where blocks are short enough for the scaling not to overflow. """
+    out = np.empty(len(values))
+    decay = 1.0 - alpha
+    if not len(values):
+        return out
+    if not 0 < decay < 1:
+        for i, value in enumerate(values):
+            mean = value if mean is None else alpha * value + decay * mean
+            out[i] = mean
+        return out
+
+    ## Averages are shifted along with the values, so shift them close to 0
+    shift = values[0]
+    values = values - shift
+    mean = 0.0 if mean is None else mean - shift
+    block = max(int(-230 / np.log(decay)), 1)
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        out[start:start + len(chunk)] = \
+            powers * (mean + alpha * np.cumsum(chunk / powers))
+        mean = out[start + len(chunk) - 1]
+    return out + shift
+
+
+def _moving_stats(values, n, weights=None, cache=None):
+    """ Return the means and variances of the moving windows of length *n*
+    over the array *values* (weighted by the array *weights*, if given), just
+    like :class:`MA` calculates them. They are calculated from cumulative
+    sums over blocks of a few windows (see :func:`base._blocks`), where the
+    values are shifted by the first one of each block, which keeps the sums
+    small however far the values drift. The sums are kept in the dict
+    *cache* (if given) to be shared by other windows over the same values
+    (and weights, by which they are keyed) and blocks. """
+    size = len(values)
+    block = base._block(n, size)
+    if cache is None:
+        cache, key = {}, None
+    elif weights is None:
+        key = 'moving', block
+    else:
+        key = 'weighted moving', block, hashlib.sha1(
+            np.ascontiguousarray(weights, dtype=float)).hexdigest()
+    if key not in cache:
+        ones = np.ones(size) if weights is None else weights
+        wrows, rows = base._blocks(block, ones, values)
+        anchors = rows[:, block]
+        shifted = rows - anchors[:, None]
+        cache[key] = anchors, [base._cumulative(x) for x in (
+            wrows, wrows * shifted, wrows * shifted ** 2)]
+    anchors, cumulatives = cache[key]
+
+    ## Window sums are differences of cumulative sums
+    rows, starts, ends = base._block_windows(block, n, size)
+    wsums, sums, ssums = [x[rows, ends] - x[rows, starts] for x in cumulatives]
+    means = sums / wsums
+    variances = np.maximum(ssums / wsums - means ** 2, 0)
+    means += anchors[rows]
+    base._unrecovered(values if weights is None else values * weights,
+                      means, variances)
+    return means, variances
+
 
 class EMA(base.Mover):
     """ A fast exponential moving average with typical period of size *n*.
@@ -98,6 +173,81 @@ class EMA(base.Mover):
         self._mean = None
         self._var = None
 
+    def batch(self, data):
+        """ Return what a fresh mover would return for each number of *data*,
+        as an array (with a row of mean and std for each, if *mstd*), where
+        ``None`` values reset the mover (and NaN stands for their output). """
+        values, resets = base._split_resets(data)
+        if resets.any():
+            return base._by_segments(self.batch, resets, values)
+        values = values.astype(float)
+        means = _ema(values, self._alpha)
+        if self.mstd:
+            previous = np.concatenate((values[:1], means[:-1]))
+            stds = _ema((values - means) * (values - previous), self._alpha,
+                        mean=0.0) ** 0.5
+            means = np.column_stack((means, stds))
+        return base._patient(self, means, self.n)
+
+
+class MultiEMA(base.Mover):
+    """ Exponential moving averages of several typical periods *ns* over the
+    same data. An EMA needs no window at all, so this only saves the per-step
+    call overhead of running many :class:`EMA` movers side by side. Every
+    step returns a list holding, for each period in *ns* (in order), what
+    :class:`EMA` of that period would have returned. The mover is triggered
+    once the longest period is.
+
+    Example:
+
+    >>> data = [1, 2, 3, 3, 3]
+    >>> mema = MultiEMA([1, 3])
+    >>> [mema(value) for value in data]
+    [[1.0, 1.0], [2.0, 1.5], [3.0, 2.25], [3.0, 2.625], [3.0, 2.8125]]
+    """
+    def __init__(self, ns, mstd=False, **mover_kwargs):
+        self.ns = tuple(ns)
+        self.mstd = mstd
+        self._alphas = [2.0 / (n + 1.0) for n in self.ns]
+        super(MultiEMA, self).__init__(**mover_kwargs)
+
+    @property
+    def triggered(self):
+        return self.count > max(self.ns)
+
+    @triggered.setter
+    def triggered(self, value):
+        if not value:
+            self.count = 0
+
+    def _eat(self, value):
+        self.count += 1
+
+        ## No mean exist, the new value is the new mean of all periods
+        if self._means is None:
+            self._means = [value * 1.0] * len(self.ns)
+            self._vars = [0.0] * len(self.ns)
+
+        ## Calculate new means (and variances) from the last ones
+        else:
+            for i, alpha in enumerate(self._alphas):
+                mean = self._means[i]
+                new_mean = alpha * value + (1 - alpha) * mean
+                if self.mstd:
+                    self._vars[i] = alpha * (value - new_mean)\
+                        * (value - mean) + (1 - alpha) * self._vars[i]
+                self._means[i] = new_mean
+
+        ## Return means (and standard deviations)
+        if self.mstd:
+            return [(mean, var ** 0.5)
+                    for mean, var in zip(self._means, self._vars)]
+        return list(self._means)
+
+    def _zero(self):
+        self._means = None
+        self._vars = None
+
 
 class MA(base.Mover):
     """ A fast moving average of data of length *n*. This is practically O(m)
@@ -173,6 +323,100 @@ class MA(base.Mover):
         self._ssum = 0.0
         self._wssum = 0.0
 
+    def batch(self, data, weights=None, cache=None):
+        """ Return what a fresh mover would return for each of *data*,
+        numbers (weighted by *weights*, if given) or ``(value, weight)``
+        pairs, as an array (with a row of mean and std for each, if *mstd*),
+        where ``None`` values reset the mover (and NaN stands for their
+        output). Cumulative sums are shared through the dict *cache*, see
+        :func:`_moving_stats`. """
+        values, resets = base._split_resets(data)
+        if values.ndim == 2:
+            values, weights = values[:, 0], values[:, 1]
+        values = values.astype(float)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+
+        ## Segments between resets have sums of their own
+        if resets.any():
+            arrays = (values,) if weights is None else (values, weights)
+            return base._by_segments(self.batch, resets, *arrays)
+        means, variances = _moving_stats(values, self.n, weights, cache)
+        if self.mstd:
+            means = np.column_stack((means, variances ** 0.5))
+
+        ## The trigger of MA is never raised
+        return base._patient(self, means, len(means))
+
+
+class MultiMA(base.Mover):
+    """ Moving averages of several lengths *ns* over the same data. A single
+    window, sized for the longest length, is shared by all of them, and each
+    length keeps only its own sums. Every step returns a list holding, for
+    each length in *ns* (in order), what :class:`MA` of that length would
+    have returned.
+
+    Examples:
+
+    >>> data = [1, 2, 3, 3, 3]
+    >>> mma = MultiMA([1, 3])
+    >>> [mma(value) for value in data]
+    [[1.0, 1.0], [2.0, 1.5], [3.0, 2.0], [3.0, 2.6666666666666665], [3.0, 3.0]]
+    >>> mma = MultiMA([2, 3], mstd=True)
+    >>> [x[1] for x in mma(3)], [x[1] for x in mma(5)]
+    ([0.0, 0.0], [1.0, 1.0])
+    """
+    def __init__(self, ns, mstd=False, **kwargs):
+        self.ns = tuple(ns)
+        self.mstd = mstd
+        super(MultiMA, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        try:
+            iter(value)
+            value, weight = value
+        except TypeError:
+            weight = 1
+
+        deque = self._deque
+        length = len(deque)
+        results = []
+        for i, n in enumerate(self.ns):
+
+            ## A value falls out of this length's window
+            if length >= n:
+                out, oweight = deque[-n]
+                self._sums[i] += value * weight - out * oweight
+                self._wsums[i] += weight - oweight
+                if self.mstd:
+                    self._wssums[i] += weight * value**2 - oweight * out**2
+
+            ## No fallen value, so increase-only is made
+            else:
+                self._sums[i] += value * weight
+                self._wsums[i] += weight
+                if self.mstd:
+                    self._wssums[i] += weight * value**2
+
+            ## Calculate current mean (and std)
+            _mean = self._sums[i] / self._wsums[i]
+            if self.mstd:
+                _var = (self._wssums[i] * self._wsums[i] - self._sums[i] ** 2)\
+                    / (self._wsums[i] ** 2)
+                results.append((_mean, max(_var, 0) ** 0.5))
+            else:
+                results.append(_mean)
+
+        ## Only now the new value may push the oldest one out
+        deque.append((value, weight))
+        return results
+
+    def _zero(self):
+        self._deque = self._get_deque(max(self.ns))
+        self._sums = [0.0] * len(self.ns)
+        self._wsums = [0.0] * len(self.ns)
+        self._wssums = [0.0] * len(self.ns)
+
 
 class GMA(MA):
     def _eat(self, value):
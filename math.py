@@ -6,7 +6,10 @@ Simple math movers.
 
 ## Inheritance
 import base
-# import library.movers.pushqueue as pq
+import pushqueue as pq
+
+## Batch kernels
+import numpy as np
 
 ## Inifinity definition
 inf = float("inf")
@@ -78,6 +81,33 @@ class MovingMin(base.Mover):
             return None
 
 
+class MovingReduce(base.Mover):
+    """ Reduces a moving data window of length *n* (which is infinite by
+    default) by a *function* of two values, which should be associative, but
+    needs not be commutative or invertible (e.g. product, gcd, bitwise or,
+    logsumexp). Each step takes amortized O(1) calls of *function*, see
+    :class:`pushqueue.ReduceQueue`.
+
+    Example:
+
+    >>> import operator
+    >>> mprod = MovingReduce(operator.mul, 3)
+    >>> [mprod(x) for x in [1, 2, 3, 4, 0, 5, 6, 7]]
+    [1, 2, 6, 24, 0, 0, 0, 210]
+    """
+    def __init__(self, function, n=inf, **kwargs):
+        self.function = function
+        self.n = n
+        super(MovingReduce, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        self._queue.push(value)
+        return self._queue.reduced
+
+    def _zero(self):
+        self._queue = pq.ReduceQueue(self.function, maxlen=self.n)
+
+
 class MovingRatio(base.Mover):
     """ A mover which return the ratio between the current value and the
     last value. """
@@ -135,11 +165,67 @@ class MovingSum(base.Mover):
         self._sum = 0
 
 
+class MultiMovingSum(base.Mover):
+    """ Counts the accumulating sums of moving data windows of several
+    lengths *ns* at once. A single window, sized for the longest length, is
+    shared by all of them. Every step returns a list of the sums, in the order
+    of *ns*.
+
+    Example:
+
+    >>> msums = MultiMovingSum([2, 3, inf])
+    >>> [msums(x) for x in range(5)]
+    [[0, 0, 0], [1, 1, 1], [3, 3, 3], [5, 6, 6], [7, 9, 10]]
+    """
+    def __init__(self, ns):
+        self.ns = tuple(ns)
+        super(MultiMovingSum, self).__init__()
+
+    def _eat(self, value):
+        deque = self._deque
+        length = len(deque)
+
+        ## Increase each sum, and decrease it by its fallen value (if any)
+        for i, n in enumerate(self.ns):
+            if length >= n:
+                self._sums[i] += value - deque[-n]
+            else:
+                self._sums[i] += value
+
+        ## Only now the new value may push the oldest one out
+        deque.append(value)
+        return list(self._sums)
+
+    def _zero(self):
+        self._deque = base.Deque((), maxlen=max(self.ns))
+        self._sums = [0] * len(self.ns)
+
+
 def sgn(x):
     """ Return the sign of *x*. """
     return 1 if x.real > 0 else -1 if x.real < 0 else 0
 
 
+## Size of the chunks in which custom functions are applied to batches
+CHUNK = 2 ** 16
+
+
+def _segment_positions(resets):
+    """ Return, for each position, how many positions have passed since the
+    last reset (or the beginning). """
+    index = np.arange(len(resets))
+    return index - np.maximum.accumulate(np.where(resets, index + 1, 0))
+
+
+def _with_resets(out, resets):
+    """ Return *out*, with ``None`` wherever there was a reset. """
+    if not resets.any():
+        return out
+    out = np.array(out.tolist() + [None])[:-1]
+    out[resets] = None
+    return out
+
+
 class SignTracker(base.Mover):
     """ Counts length of successing similar-signed values, where a 0 value
     does not change trend, and ``None`` zeros the trend. By default, the
@@ -161,10 +247,16 @@ class SignTracker(base.Mover):
     >>> data = [2, 3, -0.5, None, -1, 0, -1, 1]
     >>> [tracker(value) for value in data]
     [1, 2, 3, 0, -1, -2, -3, 1]
+
+    Gated, so that a count which stays the same is no change:
+
+    >>> tracker = SignTracker(gate=0)
+    >>> [(tracker(value), tracker.changed) for value in [0, 0, 1, 1]]
+    [(0, True), (0, False), (1, True), (2, True)]
     """
-    def __init__(self, sgn=sgn):
+    def __init__(self, sgn=sgn, **kwargs):
         self.sgn = sgn
-        super(SignTracker, self).__init__()
+        super(SignTracker, self).__init__(**kwargs)
 
     def _eat(self, value):
         ## Get current+new signs
@@ -184,6 +276,46 @@ class SignTracker(base.Mover):
         self._count = 0
         return 0
 
+    def batch(self, data):
+        """ Return, as an integer array, what a fresh tracker would return
+        for each of *data*, where ``None`` values reset the trend. A custom
+        *sgn* is applied in chunks, the rest is done at array speed.
+
+        Checked against the tracker itself, with and without a custom *sgn*:
+
+        >>> import harness
+        >>> my_sgn = lambda x: 1 if x >= 1.0 else -1 if x <= -1 else 0
+        >>> for factory in [SignTracker, lambda: SignTracker(sgn=my_sgn)]:
+        ...     reports = harness.check(factory, kinds=['resets', 'ties'])
+        ...     [report.mismatches for report in reports]
+        [[], []]
+        [[], []]
+        """
+        values, resets = base._split_resets(data)
+        size = len(values)
+
+        ## Get signs
+        if self.sgn is sgn and values.dtype.kind in 'biufc':
+            real = np.real(values)
+            signs = (real > 0).astype(int) - (real < 0)
+        else:
+            signs = np.zeros(size, dtype=int)
+            for start in range(0, size, CHUNK):
+                chunk = slice(start, start + CHUNK)
+                signs[chunk] = [0 if reset else self.sgn(value) for
+                                value, reset in zip(data[chunk], resets[chunk])]
+
+        ## Resets act as a sign of their own, which no trend survives
+        index = np.arange(size)
+        signs = np.where(resets, 2, signs)
+        trends = signs[np.maximum.accumulate(np.where(signs, index, 0))]
+
+        ## Count the length of each trend so far
+        starts = np.ones(size, dtype=bool)
+        starts[1:] = trends[1:] != trends[:-1]
+        starts = np.maximum.accumulate(np.where(starts, index, 0))
+        return (index - starts + 1) * np.where(trends == 2, 0, trends)
+
 
 def _dffsgn(old, new):
     return sgn(new-old)
@@ -209,11 +341,21 @@ class ToneTracker(base.Mover):
     >>> data = [[1, 2], (3,), {4: 5, 6: 7}, range(8)]
     >>> [tracker(value) for value in data]
     [None, -1, 1, 1]
+
+    Gated, with a listener which only hears of changes of tone (and resets):
+
+    >>> tracker = ToneTracker(gate=0)
+    >>> tones = []
+    >>> tracker.subscribe(tones.append)
+    >>> [tracker(value) for value in [1, 2, 3, 2, 1, None, 1, 2]]
+    [None, 1, 1, -1, -1, None, None, 1]
+    >>> tones
+    [None, 1, -1, None, None, 1]
     """
-    def __init__(self, gap=1, toner=_dffsgn):
+    def __init__(self, gap=1, toner=_dffsgn, **kwargs):
         self.gap = gap
         self.toner = toner
-        super(ToneTracker, self).__init__()
+        super(ToneTracker, self).__init__(**kwargs)
 
     def _eat(self, value):
         ## Get old value
@@ -227,6 +369,46 @@ class ToneTracker(base.Mover):
         ## Reset a deque
         self._deque = base.Deque((), maxlen=self.gap)
 
+    def batch(self, data):
+        """ Return, as an object array, what a fresh tracker would return for
+        each of *data*, where ``None`` values reset the tracker. A custom
+        *toner* is applied in chunks, the rest is done at array speed.
+
+        Checked against the tracker itself, with and without a custom
+        *toner*:
+
+        >>> import harness
+        >>> my_toner = lambda old, new: sgn(round(new) - round(old))
+        >>> for factory in [lambda: ToneTracker(gap=3),
+        ...                 lambda: ToneTracker(gap=3, toner=my_toner)]:
+        ...     reports = harness.check(factory, kinds=['resets', 'ties'])
+        ...     [report.mismatches for report in reports]
+        [[], []]
+        [[], []]
+        """
+        values, resets = base._split_resets(data)
+        size = len(values)
+        out = np.array([None] * size, dtype=object)
+
+        ## Tones are only given once there are *gap* values since the reset
+        valid = ~resets & (_segment_positions(resets) >= self.gap)
+        new = np.flatnonzero(valid)
+        old = new - self.gap
+
+        ## Booleans are subtracted as the integers they are in Python
+        if values.dtype.kind == 'b':
+            values = values.astype(int)
+
+        if self.toner is _dffsgn and values.dtype.kind in 'iufc':
+            diffs = np.real(values[new] - values[old])
+            out[new] = ((diffs > 0).astype(int) - (diffs < 0)).tolist()
+        else:
+            for start in range(0, len(new), CHUNK):
+                chunk = slice(start, start + CHUNK)
+                out[new[chunk]] = [self.toner(data[i], data[j]) for i, j in
+                                   zip(old[chunk], new[chunk])]
+        return out
+
 
 class LocalExtrema(base.Mover):
     """ Tracks local extremas, where "extrema" in this sense is a value which is
@@ -252,14 +434,22 @@ class LocalExtrema(base.Mover):
     >>> lmin21 = LocalExtrema(-1, 2, 1, False)
     >>> [lmin21(x) for x in data]
     [False, False, False, False, False, True, False, False, True]
+
+    Gated, with a listener which only hears of changes:
+
+    >>> lmax11s = LocalExtrema(1, 1, 1, True, gate=0)
+    >>> flags = []
+    >>> lmax11s.subscribe(flags.append)
+    >>> [lmax11s(x) for x in data].count(True), flags
+    (2, [False, True, False, True, False])
     """
-    def __init__(self, direction=1, left=1, right=1, strict=True):
+    def __init__(self, direction=1, left=1, right=1, strict=True, **kwargs):
         self.direction = direction
         self._ext = max if self.direction == 1 else min
         self.left = left
         self.right = right
         self.strict = strict
-        super(LocalExtrema, self).__init__()
+        super(LocalExtrema, self).__init__(**kwargs)
 
     def _cmp(self, a, b):
         return sgn(a - b) * self.direction >= int(self.strict)
@@ -315,6 +505,68 @@ class LocalExtrema(base.Mover):
         self._empty_rd()
         self._del_c()
 
+    def batch(self, data):
+        """ Return what a fresh tracker would return for each of *data* (a
+        boolean array, or an object array if there are ``None`` resets).
+
+        A value is reported, *right* values later, if it is higher (lower)
+        than its *left* neighbours and no lower (higher) than its *right*
+        ones; this agrees with the tracker as long as ``1 <= right <= left``.
+        Otherwise, or for non-numeric or NaN data, the tracker itself is
+        run.
+
+        Checked against the tracker itself, at array speed and not:
+
+        >>> import harness
+        >>> for factory in [lambda: LocalExtrema(-1, 3, 2),
+        ...                 lambda: LocalExtrema(1, 1, 2, strict=False)]:
+        ...     reports = harness.check(factory,
+        ...                             kinds=['nans', 'resets', 'ties'])
+        ...     [report.mismatches for report in reports]
+        [[], [], []]
+        [[], [], []]
+        """
+        values, resets = base._split_resets(data)
+        if not (1 <= self.right <= self.left) or \
+                values.dtype.kind not in 'biuf' or np.isnan(values).any():
+            tracker = self.__class__(self.direction, self.left, self.right,
+                                     self.strict)
+            out = [tracker(value) for value in data]
+            return np.array(out, dtype=object if resets.any() else bool)
+
+        ## Find extremas within each segment between resets
+        out = np.zeros(len(values), dtype=bool)
+        bounds = np.flatnonzero(resets)
+        for start, stop in zip(np.append(0, bounds + 1),
+                               np.append(bounds, len(values))):
+            out[start:stop] = self._extremas(values[start:stop])
+        return _with_resets(out, resets)
+
+    def _extremas(self, values):
+        """ Return where extremas of *values* are reported. """
+        left, right = self.left, self.right
+        out = np.zeros(len(values), dtype=bool)
+        if len(values) <= left + right:
+            return out
+        windows = np.lib.stride_tricks.sliding_window_view
+
+        ## Minima are the maxima of the negated values
+        if self.direction == -1:
+            values = -values.astype(float if values.dtype.kind in 'bu'
+                                    else values.dtype)
+
+        ## Values which beat their left neighbourhood, and are not beaten by
+        ## their right one
+        candidates = values[left:len(values) - right]
+        lefts = windows(values[:-right - 1], left).max(axis=1)
+        rights = windows(values[left + 1:], right).max(axis=1)
+        if self.strict:
+            wins = (candidates > lefts) & (candidates >= rights)
+        else:
+            wins = (candidates >= lefts) & (candidates > rights)
+        out[left + right:] = wins
+        return out
+
 
 ## Naive version, until I'll find a better one
 class SignModCounter(base.Mover):
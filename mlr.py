@@ -9,7 +9,9 @@ import base as base
 
 ## Math
 import math
+import numpy as np
 inf = float('inf')
+nan = float('nan')
 
 
 class MLRS(base.Mover):
@@ -73,3 +75,49 @@ class MLRS(base.Mover):
         self._xy = 0.0
         self._xx = 0
 
+    def batch(self, data, cache=None):
+        """ Return what a fresh mover would return for each number of *data*,
+        as an array (with a row of slope and intercept for each, if *mlri*),
+        where NaN stands for ``None``, and ``None`` values reset the mover.
+        The regressions are calculated from cumulative sums over blocks (see
+        :func:`base._blocks`), which are kept in the dict *cache* (if given)
+        to be shared by other windows over the same values and blocks. """
+        values, resets = base._split_resets(data)
+        if resets.any():
+            return base._by_segments(self.batch, resets, values)
+        values = values.astype(float)
+        size = len(values)
+        cache = {} if cache is None else cache
+        block = base._block(self._n, size)
+        key = 'regression', block
+        if key not in cache:
+            ones, rows = base._blocks(block, np.ones(size), values)
+            anchors = rows[:, block]
+            shifted = ones * (rows - anchors[:, None])
+            cache[key] = anchors, [base._cumulative(x) for x in (
+                shifted, np.arange(2 * block) * shifted)]
+        anchors, (ys, xys) = cache[key]
+
+        ## Window sums are differences of cumulative sums over blocks, where
+        ## the values are shifted by the first one of the block
+        rows, starts, ends = base._block_windows(block, self._n, size)
+        lengths = ends - starts
+        y = ys[rows, ends] - ys[rows, starts]
+        xy = xys[rows, ends] - xys[rows, starts] - starts * y
+        x = lengths * (lengths - 1) / 2.0
+        xx = (lengths - 1) * lengths * (2 * lengths - 1) / 6.0
+
+        ## Calculate slopes (and intercepts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = (lengths * xy - x * y) / (lengths * xx - x ** 2)
+        out[lengths <= 1] = nan
+        if self.mlri:
+            intercepts = (y - out * x) / lengths + anchors[rows]
+            base._unrecovered(values, out, intercepts)
+            out = np.column_stack((out, intercepts))
+        else:
+            base._unrecovered(values, out)
+
+        ## The trigger of MLRS is never raised
+        return base._patient(self, out, len(out))
+
@@ -6,8 +6,17 @@ import abc
 import collections as col
 import numpy as np
 
+## Memory accounting
+import base
+import sys
 
-class PushQueue(col.Sized):
+try:
+    from collections.abc import Sized
+except ImportError:
+    from collections import Sized
+
+
+class PushQueue(Sized):
     __metaclass__ = abc.ABCMeta
 
     @abc.abstractmethod
@@ -115,3 +124,112 @@ class MinQueue(DequeQueue):
     @property
     def min(self):
         return self.head
+
+
+class ReduceQueue(PushQueue):
+    """ A PushQueue which reduces its values by a *function* of two values,
+    which should be associative (but needs not be commutative or invertible),
+    in amortized O(1) time per push. The values are kept in two stacks: new
+    values are pushed onto the back stack, along with their running
+    reduction, and old values are popped off the front stack, where each
+    value is kept along with the reduction of it and all newer values in
+    that stack. Once the front stack is empty, the back stack is flipped
+    onto it.
+
+    Example:
+
+    >>> import operator
+    >>> queue = ReduceQueue(operator.add, maxlen=2)
+    >>> for value in 'abc':
+    ...     queue.push(value)
+    ...     queue.reduced
+    'a'
+    'ab'
+    'bc'
+    """
+    def __init__(self, function, maxlen=None):
+        self.function = function
+        if maxlen is None:
+            self.maxlen = np.inf
+        else:
+            try:
+                self.maxlen = int(maxlen)
+            except OverflowError:
+                self.maxlen = np.inf
+        self.clear()
+
+    def __len__(self):
+        return len(self._front) + len(self._back)
+
+    def _worst_nbytes(self, seen):
+        """ Return the most memory (in bytes) held by the queue (see
+        :func:`base.sizeof`): at most *maxlen* values, each along with a
+        reduction, of the size of the current ones (or of a float, while
+        empty). """
+        if self.maxlen == np.inf:
+            return np.inf
+        items = [item for pair in self._front for item in pair] + self._back
+        item = sum(sys.getsizeof(item) for item in items) / float(
+            len(items)) if items else sys.getsizeof(0.0)
+        pair = sys.getsizeof((None, None)) + 2 * item
+        slot = sys.getsizeof([None]) - sys.getsizeof([])
+
+        ## Values on the back stack get paired once they are flipped
+        return base.sizeof(vars(self), True, seen) + \
+            len(self._back) * pair + (self.maxlen - len(self)) * (slot + pair)
+
+    def clear(self):
+        self._front = []
+        self._back = []
+        self._back_reduced = None
+
+    @property
+    def head(self):
+        if self._front:
+            return self._front[-1][0]
+        try:
+            return self._back[0]
+        except IndexError:
+            raise KeyError("Queue has no head (it is empty).")
+
+    def push(self, value):
+        if self._back:
+            self._back_reduced = self.function(self._back_reduced, value)
+        else:
+            self._back_reduced = value
+        self._back.append(value)
+        if len(self) > self.maxlen:
+            self._pop()
+
+    def _pop(self):
+        ## Flip the back stack onto the front one
+        if not self._front:
+            for value in reversed(self._back):
+                if self._front:
+                    reduced = self.function(value, self._front[-1][1])
+                else:
+                    reduced = value
+                self._front.append((value, reduced))
+            self._back = []
+            self._back_reduced = None
+        self._front.pop()
+
+    @property
+    def reduced(self):
+        """ The reduction of all values in the queue, oldest first. """
+        if self._front and self._back:
+            return self.function(self._front[-1][1], self._back_reduced)
+        if self._front:
+            return self._front[-1][1]
+        if self._back:
+            return self._back_reduced
+        raise KeyError("Queue has no reduction (it is empty).")
+
+    @property
+    def tail(self):
+        if self._back:
+            return self._back[-1]
+        try:
+            return self._front[0][0]
+        except IndexError:
+            raise KeyError("Queue has no tail (it is empty).")
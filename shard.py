@@ -0,0 +1,170 @@
+"""
+.. shard.py
+
+Sharded multi-threaded feeding of many movers.
+"""
+
+## Data
+import numpy as np
+
+## Parallelism
+import multiprocessing
+import threading
+from multiprocessing.pool import ThreadPool
+
+## Timing
+import timeit
+
+
+def _tree(mover):
+    """ Return the movers in the tree of *mover* (including it). """
+    movers = [mover]
+    for child in getattr(mover, 'movers', ()):
+        movers.extend(_tree(child))
+    return movers
+
+
+class Shards(object):
+    """ Movers registered by keys, and split among *threads* shards (as many
+    as there are CPUs, by default), each fed by one thread at a time.
+
+    Movers share no locks, and (for instance) :meth:`base.Deque.push` checks
+    the length of a deque and appends to it in two separate steps, so a
+    mover must never be fed by two threads at once. Hence the ownership
+    rule: each mover (along with the tree of its inner movers) belongs to
+    exactly one key, and each key to exactly one shard, fed by a single task.
+    Registering a mover which already belongs to another key is refused,
+    and feeding calls are serialized.
+
+    Values are batched per shard, so a shard's thread works through all of
+    its values (or arrays, see :meth:`backfill`) at once. Shards only run in
+    parallel while their threads are in NumPy calls which release the GIL,
+    such as the cumulative sums of :meth:`ma.MA.batch` over long arrays;
+    Python loops (feeding values one at a time, or the blocks of
+    :meth:`ma.EMA.batch`) hold it, and only scale on free-threaded builds.
+
+    Example:
+
+    >>> import ma
+    >>> shards = Shards(2)
+    >>> shards.add('a', ma.MA(2))
+    >>> shards.add('b', ma.MA(3))
+    >>> out = shards.feed([('a', 1), ('b', 1), ('a', 3), ('b', 4)])
+    >>> out['a'], out['b']
+    ([1.0, 2.0], [1.0, 2.5])
+    >>> shards.close()
+    """
+    def __init__(self, threads=None):
+        self.threads = threads or multiprocessing.cpu_count()
+        self._shards = [{} for _ in range(self.threads)]
+        self._owners = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPool(self.threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, key):
+        return self._shards[self.shard(key)][key]
+
+    def __len__(self):
+        return sum(map(len, self._shards))
+
+    def shard(self, key):
+        """ Return the index of the shard owning *key*. """
+        return hash(key) % self.threads
+
+    def add(self, key, mover):
+        """ Register *mover* by *key*. """
+        shard = self._shards[self.shard(key)]
+        if key in shard:
+            raise KeyError("Key {key!r} is already registered.".format(
+                key=key))
+        tree = _tree(mover)
+        for inner in tree:
+            if id(inner) in self._owners:
+                raise ValueError(
+                    "Mover {mover!r} already belongs to key {key!r}.".format(
+                        mover=inner, key=self._owners[id(inner)]))
+        for inner in tree:
+            self._owners[id(inner)] = key
+        shard[key] = mover
+
+    def _map(self, function, batches):
+        """ Apply *function* to each shard and its batch, in the shards'
+        threads, and return the merged dict of results. """
+        with self._lock:
+            results = self._pool.map(
+                lambda i: function(self._shards[i], batches[i]),
+                range(self.threads))
+        merged = {}
+        for result in results:
+            merged.update(result)
+        return merged
+
+    def feed(self, ticks):
+        """ Feed *ticks*, ``(key, value)`` pairs, to the movers of their keys
+        (in order, per key), and return a dict of the lists of their
+        outputs, by keys. """
+        batches = [[] for _ in range(self.threads)]
+        for key, value in ticks:
+            batches[self.shard(key)].append((key, value))
+
+        def feed_shard(movers, batch):
+            outputs = {}
+            for key, value in batch:
+                outputs.setdefault(key, []).append(movers[key](value))
+            return outputs
+        return self._map(feed_shard, batches)
+
+    def backfill(self, arrays):
+        """ Run the movers over *arrays*, a dict of data arrays by keys, and
+        return a dict of their outputs, by keys. Movers with a batch method
+        return its output (which is computed from a fresh state, leaving the
+        mover as it is); others eat their arrays, and return arrays of their
+        outputs. """
+        batches = [{} for _ in range(self.threads)]
+        for key, array in arrays.items():
+            batches[self.shard(key)][key] = array
+
+        def backfill_shard(movers, arrays):
+            outputs = {}
+            for key, array in arrays.items():
+                mover = movers[key]
+                try:
+                    batch = mover.batch
+                except AttributeError:
+                    outputs[key] = np.array([mover(value) for value in array])
+                else:
+                    outputs[key] = batch(array)
+            return outputs
+        return self._map(backfill_shard, batches)
+
+    def close(self):
+        """ Stop the threads. """
+        self._pool.close()
+        self._pool.join()
+
+
+def scaling(factory, data, counts=(1, 2, 4, 8), backfill=False):
+    """ Return the ``(threads, seconds)`` pairs it takes movers made by
+    *factory* (a function of a key) to eat *data*, a dict of value sequences
+    by keys, when they are fed (values of the different keys interleaved) or
+    backfilled (see :meth:`Shards.backfill`) by each of *counts* threads. """
+    ticks = [(key, values[i]) for i in range(max(map(len, data.values())))
+             for key, values in data.items() if i < len(values)]
+    timings = []
+    for count in counts:
+        with Shards(count) as shards:
+            for key in data:
+                shards.add(key, factory(key))
+            start = timeit.default_timer()
+            if backfill:
+                shards.backfill(data)
+            else:
+                shards.feed(ticks)
+            timings.append((count, timeit.default_timer() - start))
+    return timings
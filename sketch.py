@@ -0,0 +1,287 @@
+"""
+.. sketch.py
+
+Movers counting distinct and heavy items of a moving data window: exact
+ones, keeping the whole window, and sketches, keeping bounded memory at the
+cost of bounded errors.
+"""
+
+## Inheritance
+import base
+
+## Data
+import heapq
+import operator as op
+import numpy as np
+
+inf = float('inf')
+
+## 64 bits
+_MASK = (1 << 64) - 1
+
+
+def _hash(item, seed=0):
+    """ Return a well mixed 64 bit hash of *item* (splitmix64 of its
+    ``hash``), differing by *seed*. """
+    x = (hash(item) ^ (seed * 0x9E3779B97F4A7C15) ^ 0x9E3779B97F4A7C15) & _MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+##########################
+## ----- Distinct ----- ##
+##########################
+
+class MovingDistinct(base.Mover):
+    """ Counts the distinct items of a moving data window of length *n*
+    (which is infinite by default), exactly.
+
+    Example:
+
+    >>> distinct = MovingDistinct(3)
+    >>> [distinct(x) for x in 'abacca']
+    [1, 2, 2, 3, 2, 2]
+    """
+    def __init__(self, n=inf, **kwargs):
+        self.n = n
+        super(MovingDistinct, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        out = self._deque.push(value)
+        self._counts[value] = self._counts.get(value, 0) + 1
+        if out is not self._deque.none:
+            self._counts[out] -= 1
+            if not self._counts[out]:
+                del self._counts[out]
+        return len(self._counts)
+
+    def _zero(self):
+        self._deque = self._get_deque(self.n)
+        self._counts = {}
+
+
+class MovingDistinctSketch(base.Mover):
+    """ Estimates the number of distinct items of a moving data window of
+    length *n* (which is infinite by default) with a sliding HyperLogLog of
+    ``2 ** precision`` registers, whose relative standard error is about
+    ``1.04 / 2 ** (precision / 2.)`` (3% for the default precision of 10).
+
+    Each register keeps the ranks which may still become its maximum: a
+    flat list of steps and ranks (``[step, rank, step, rank, ...]``), with
+    decreasing ranks, which is expected to hold O(log n) pairs. Heads of
+    registers expire through a heap of their steps (each packed along with
+    the register into one number), so each step takes amortized
+    O(log registers) time.
+
+    Registers are kept whatever the window holds, and each step hashes in
+    Python (so it is about twice as slow as :class:`MovingDistinct`), so the
+    sketch only pays off once the window holds many more distinct items than
+    there are registers: at a precision of 10, it is half the size of the
+    exact mover with 5000 distinct items, and 40 times smaller with 100000.
+    For smaller windows, a lower precision (8 is about 6% off, and 3 times
+    smaller) or the exact mover is the better choice.
+
+    Example:
+
+    >>> distinct = MovingDistinctSketch(1000)
+    >>> [int(round(distinct(x))) for x in 'abacca']
+    [1, 2, 2, 3, 3, 3]
+    """
+    def __init__(self, n=inf, precision=10, **kwargs):
+        self.n = n
+        self.precision = precision
+        self._m = 1 << precision
+        self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(
+            self._m, 0.7213 / (1 + 1.079 / self._m))
+        super(MovingDistinctSketch, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        step = self._step = self._step + 1
+        precision = self.precision
+        mask = self._m - 1
+
+        ## Expire heads of registers which have fallen out of the window
+        heap = self._heap
+        while heap and heap[0] >> precision <= step - self.n:
+            head = heapq.heappop(heap)
+            j = head & mask
+            register = self._registers[j]
+            if register and register[0] == head >> precision:
+                del register[:2]
+                if register:
+                    heapq.heappush(heap, register[0] << precision | j)
+                self._update(j)
+
+        ## Find the register and rank of the item
+        h = _hash(value)
+        j = h & mask
+        w = h >> precision
+        rank = (w & -w).bit_length() if w else 64 - precision + 1
+
+        ## Ranks not higher than the new one may never be maxima again
+        register = self._registers[j]
+        while register and register[-1] <= rank:
+            del register[-2:]
+        register += (step, rank)
+        if len(register) == 2:
+            heapq.heappush(heap, step << precision | j)
+        self._update(j)
+
+        return self.estimate
+
+    def _update(self, j):
+        """ Update the harmonic sum after the maximum of register *j* may
+        have changed. """
+        register = self._registers[j]
+        maximum = register[1] if register else 0
+        if maximum != self._maxima[j]:
+            self._sum += 2.0 ** -maximum - 2.0 ** -self._maxima[j]
+            self._zeros += (not maximum) - (not self._maxima[j])
+            self._maxima[j] = maximum
+
+    @property
+    def estimate(self):
+        """ The estimated number of distinct items in the window. """
+        m = self._m
+        estimate = self._alpha * m * m / self._sum
+        if estimate <= 2.5 * m and self._zeros:
+            return m * float(np.log(float(m) / self._zeros))
+        return estimate
+
+    def _zero(self):
+        self._registers = [[] for _ in range(self._m)]
+        self._maxima = bytearray(self._m)
+        self._heap = []
+        self._sum = float(self._m)
+        self._zeros = self._m
+        self._step = 0
+
+
+###############################
+## ----- Heavy hitters ----- ##
+###############################
+
+class MovingHeavy(base.Mover):
+    """ Returns the *k* heaviest items of a moving data window of length *n*
+    (which is infinite by default), as a list of ``(item, weight)`` pairs,
+    heaviest first, exactly. Each item weighs 1, unless *weighted*, in which
+    case values are ``(item, weight)`` pairs.
+
+    Example:
+
+    >>> heavy = MovingHeavy(4, k=1)
+    >>> [heavy(x) for x in 'abbc'][-1]
+    [('b', 2)]
+    """
+    def __init__(self, n=inf, k=10, weighted=False, **kwargs):
+        self.n = n
+        self.k = k
+        self.weighted = weighted
+        super(MovingHeavy, self).__init__(**kwargs)
+
+    def _eat(self, value):
+        item, weight = value if self.weighted else (value, 1)
+        out = self._deque.push((item, weight))
+        self._weights[item] = self._weights.get(item, 0) + weight
+        if out is not self._deque.none:
+            out_item, out_weight = out
+            self._weights[out_item] -= out_weight
+            if not self._weights[out_item]:
+                del self._weights[out_item]
+        return heapq.nlargest(self.k, self._weights.items(),
+                              key=op.itemgetter(1))
+
+    def _zero(self):
+        self._deque = self._get_deque(self.n)
+        self._weights = {}
+
+
+class MovingHeavySketch(base.Mover):
+    """ Estimates the *k* heaviest items of a moving data window of length
+    *n* (see :class:`MovingHeavy`) with Count-Min sketches, whose estimates
+    exceed true weights by at most *epsilon* times the window's weight, with
+    probability ``1 - delta``.
+
+    The window is split into *blocks* blocks (*n* must be a multiple of
+    *blocks*), each with its own sketch, and expires a block at a time: it
+    covers more than ``n - n / blocks`` and at most *n* values. Estimates
+    are read from the sum of the sketches, which is kept up to date, and
+    estimates of up to *capacity* (``4 * k`` by default) candidate items are
+    kept, and refreshed whenever a block expires.
+
+    Example:
+
+    >>> heavy = MovingHeavySketch(4, k=1, blocks=4)
+    >>> [heavy(x) for x in 'abbc'][-1]
+    [('b', 2.0)]
+    """
+    def __init__(self, n, k=10, epsilon=0.01, delta=0.05, blocks=4,
+                 capacity=None, weighted=False, **kwargs):
+        if n % blocks:
+            raise ValueError("The window length n={n} is not a multiple of "
+                             "blocks={blocks}.".format(n=n, blocks=blocks))
+        self.n = n
+        self.k = k
+        self.weighted = weighted
+        self.blocks = blocks
+        self.capacity = 4 * k if capacity is None else capacity
+        self._size = int(n // blocks)
+        self._width = int(np.ceil(np.e / epsilon))
+        self._depth = int(np.ceil(np.log(1.0 / delta)))
+        super(MovingHeavySketch, self).__init__(**kwargs)
+
+    def _columns(self, item):
+        """ Return the (flat) indices of the counters of *item*, one in each
+        row, by double hashing. """
+        h = _hash(item)
+        step = (h >> 32) | 1
+        width = self._width
+        return [row * width + (h + row * step) % width
+                for row in range(self._depth)]
+
+    def _estimate(self, columns):
+        """ Return the estimated weight of the item hashed to *columns*. """
+        totals = self._totals_view
+        return min(totals[column] for column in columns)
+
+    def _eat(self, value):
+        item, weight = value if self.weighted else (value, 1)
+
+        ## Expire the oldest block, and refresh estimates
+        block = (self._step // self._size) % self.blocks
+        if self._step and not self._step % self._size:
+            self._totals -= self._counts[block]
+            self._counts[block] = 0
+            for candidate in list(self._candidates):
+                estimate = self._estimate(self._columns(candidate))
+                if estimate:
+                    self._candidates[candidate] = estimate
+                else:
+                    del self._candidates[candidate]
+        self._step += 1
+
+        ## Count the item, and keep the heaviest candidates
+        columns = self._columns(item)
+        counts, totals = self._counts_views[block], self._totals_view
+        for column in columns:
+            counts[column] += weight
+            totals[column] += weight
+        self._candidates[item] = self._estimate(columns)
+        if len(self._candidates) > self.capacity:
+            lightest = min(self._candidates, key=self._candidates.get)
+            del self._candidates[lightest]
+
+        ## Just as heapq.nlargest, but faster for so few candidates
+        return sorted(self._candidates.items(), key=op.itemgetter(1),
+                      reverse=True)[:self.k]
+
+    def _zero(self):
+        ## Counters are updated one at a time through memoryviews, which is
+        ## faster than through arrays
+        self._counts = np.zeros((self.blocks, self._depth * self._width))
+        self._totals = np.zeros(self._depth * self._width)
+        self._counts_views = [memoryview(counts) for counts in self._counts]
+        self._totals_view = memoryview(self._totals)
+        self._candidates = {}
+        self._step = 0
@@ -0,0 +1,188 @@
+"""
+.. sweep.py
+
+Parameter sweeps: running movers of many configurations over the same data,
+with their results cached on disk.
+"""
+
+## Movers
+import base
+import ma
+import mlr
+
+## Data
+import itertools as it
+import numpy as np
+
+## Caching
+import hashlib
+import os
+import tempfile
+
+## Parallelism
+from multiprocessing.pool import ThreadPool
+
+## Movers whose batch method may share cumulative sums through a cache
+SHARING = (ma.MA, mlr.MLRS)
+
+
+def grid(cls, **params):
+    """ Return the configurations of *cls* movers, ``(cls, kwargs)`` tuples,
+    with every combination of the values of *params*.
+
+    Example:
+
+    >>> [kwargs for _, kwargs in grid(ma.MA, n=[5, 10], mstd=[True])]
+    [{'mstd': True, 'n': 5}, {'mstd': True, 'n': 10}]
+    """
+    names = sorted(params)
+    return [(cls, dict(zip(names, values)))
+            for values in it.product(*[params[name] for name in names])]
+
+
+def run(config, data, cache=None):
+    """ Return the output of a fresh mover of *config* on the array *data*:
+    its batch output if it has a batch method (sharing cumulative sums
+    through the dict *cache*, if it can), and an array of its outputs
+    otherwise. """
+    cls, kwargs = config
+    mover = cls(**kwargs)
+    if isinstance(mover, SHARING):
+        return mover.batch(data, cache=cache)
+    try:
+        batch = mover.batch
+    except AttributeError:
+        return np.array([mover(value) for value in data])
+    return batch(data)
+
+
+class Cache(object):
+    """ A content-addressed cache of sweep results in the directory *path*,
+    where a result is keyed by the hash of its data and mover configuration.
+    Once the results take more than *max_bytes*, the least recently used ones
+    are evicted. """
+    def __init__(self, path, max_bytes=2 ** 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, data, config):
+        """ Return the key of the result of *config* on the array *data*, or
+        ``None`` if the result can't be cached. An object array is keyed by
+        its numbers and where its ``None`` resets are (its bytes are mere
+        pointers), and can't be cached if it holds anything else.
+
+        Example:
+
+        >>> cache = Cache(tempfile.mkdtemp())
+        >>> config = (ma.MA, {'n': 2})
+        >>> data = np.array([1, None, 2], dtype=object)
+        >>> cache.key(data, config) == cache.key(data.copy(), config)
+        True
+        >>> cache.key(np.array([1, 'a'], dtype=object), config) is None
+        True
+        """
+        cls, kwargs = config
+        resets = None
+        if data.dtype == object:
+            try:
+                data, resets = base._split_resets(data)
+            except ValueError:
+                return None
+            if data.dtype.kind not in 'biufc':
+                return None
+        digest = hashlib.sha1(np.ascontiguousarray(data).tobytes())
+        digest.update(repr((data.dtype.str, data.shape)).encode())
+        if resets is not None:
+            digest.update(b'resets')
+            digest.update(np.packbits(resets).tobytes())
+        digest.update(repr((cls.__module__, cls.__name__,
+                            sorted(kwargs.items()))).encode())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npy')
+
+    def get(self, key):
+        """ Return the result of *key*, or ``None`` if it's not cached (or
+        its file is corrupt). """
+        try:
+            result = np.load(self._file(key), allow_pickle=False)
+        except (IOError, EOFError, ValueError):
+            return None
+
+        ## Mark the result as recently used (unless it was just evicted)
+        try:
+            os.utime(self._file(key), None)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """ Cache *result* as the result of *key*, and evict least recently
+        used results, if needed. Only numeric results are cached, as loading
+        anything else would unpickle it. """
+        result = np.asarray(result)
+        if result.dtype == object:
+            return
+
+        ## Write to a temporary file first, so no one reads a partial result
+        handle, temporary = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            np.save(f, result, allow_pickle=False)
+        os.rename(temporary, self._file(key))
+        self.evict()
+
+    def evict(self):
+        """ Remove least recently used results, until all of them take at
+        most *max_bytes*. """
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npy'):
+                stat = os.stat(os.path.join(self.path, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+
+
+def sweep(data, configs, cache=None, threads=None):
+    """ Return the list of outputs (see :func:`run`) of movers of each of
+    *configs* (see :func:`grid`) on *data*. Movers which can share
+    cumulative sums do so, results found in *cache* (a :class:`Cache`) are
+    not recomputed, and the rest are computed by *threads* threads (as many
+    as there are CPUs, by default).
+
+    Example:
+
+    >>> configs = grid(ma.MA, n=[2, 3])
+    >>> [out.tolist() for out in sweep([1, 2, 3, 4], configs)]
+    [[1.0, 1.5, 2.5, 3.5], [1.0, 1.5, 2.0, 3.0]]
+    """
+    data = np.asarray(data)
+    results = [None] * len(configs)
+    if cache is not None:
+        keys = [cache.key(data, config) for config in configs]
+        results = [None if key is None else cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    ## Compute missing results, sharing cumulative sums
+    shared = {}
+    pool = ThreadPool(threads)
+    try:
+        computed = pool.map(lambda i: run(configs[i], data, shared), missing)
+    finally:
+        pool.close()
+
+    for i, result in zip(missing, computed):
+        results[i] = result
+        if cache is not None and keys[i] is not None:
+            cache.put(keys[i], result)
+    return results